@@ -3,49 +3,25 @@
 from __future__ import annotations
 
 import argparse
+import atexit
 import json
 import os
 import sys
 import time
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from bisect import bisect_left, bisect_right
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import sqlite3
-try:
-    import requests  # type: ignore
-except ModuleNotFoundError:  # fallback for environments without requests
-    import urllib.error
-    import urllib.request
-
-    class _RequestError(RuntimeError):
-        pass
-
-    class _Response:
-        def __init__(self, status: int, body: bytes) -> None:
-            self.status_code = status
-            self._body = body
-
-        def raise_for_status(self) -> None:
-            if self.status_code >= 400:
-                raise _RequestError(f"HTTP {self.status_code}")
-
-        def json(self) -> Any:
-            return json.loads(self._body.decode("utf-8"))
-
-    class _RequestsShim:
-        RequestException = _RequestError
-
-        def get(self, url: str, timeout: float = 5) -> _Response:
-            try:
-                with urllib.request.urlopen(url, timeout=timeout) as response:
-                    return _Response(response.status, response.read())
-            except urllib.error.URLError as exc:
-                raise _RequestError(str(exc)) from exc
-
-    requests = _RequestsShim()
+if TYPE_CHECKING:
+    import sqlite3
 
 PENDING = object()
-COLOR_ENABLED = True
+# Decided once at import; main() also honours --no-color.
+COLOR_ENABLED = sys.stdout.isatty() and os.environ.get("NO_COLOR") is None
+
+# Threshold pairs: (warn, critical) for level checks, (min, max) for range checks.
+Bounds = Tuple[Optional[float], Optional[float]]
+LEVEL_THRESHOLDS = ("pm25", "co2", "tvoc", "nox")
+RANGE_THRESHOLDS = ("temp_c", "humidity")
 
 
 class Style:
@@ -61,6 +37,20 @@ class Style:
     GRAY = "\033[90m"
 
 
+# Status icons as (plain, colored) pairs, built once instead of per call.
+_ICON_UNKNOWN = ("⚪", Style.GRAY + "⚪" + Style.RESET)
+_ICON_OK = ("✅", Style.GREEN + "✅" + Style.RESET)
+_ICON_WARN = ("🟨", Style.YELLOW + "🟨" + Style.RESET)
+_ICON_CRITICAL = ("🟥", Style.RED + "🟥" + Style.RESET)
+_ICON_RANGE_OK = ("✅ OK", Style.GREEN + "✅ OK" + Style.RESET)
+_ICON_LOW = ("⚠️ Low", Style.YELLOW + "⚠️ Low" + Style.RESET)
+_ICON_HIGH = ("⚠️ High", Style.YELLOW + "⚠️ High" + Style.RESET)
+
+
+def icon(pair: Tuple[str, str]) -> str:
+    return pair[1] if COLOR_ENABLED else pair[0]
+
+
 def color(text: str, code: str) -> str:
     if not COLOR_ENABLED:
         return text
@@ -72,48 +62,75 @@ def die(msg: str, code: int = 1) -> None:
     sys.exit(code)
 
 
+_LITERALS = {"true": True, "false": False, "null": None, "none": None}
+
+
 def parse_value(raw: str) -> Any:
     if raw.startswith("\"") and raw.endswith("\""):
         return raw[1:-1]
     if raw.startswith("'") and raw.endswith("'"):
         return raw[1:-1]
     lower = raw.lower()
-    if lower in ("true", "false"):
-        return lower == "true"
-    if lower in ("null", "none"):
-        return None
-    try:
-        if "." in raw:
-            return float(raw)
+    if lower in _LITERALS:
+        return _LITERALS[lower]
+    # Check the shape before converting so plain strings never raise ValueError.
+    digits = raw[1:] if raw[:1] in ("-", "+") else raw
+    if digits.isdecimal():
         return int(raw)
-    except ValueError:
-        return raw
+    if digits.count(".") == 1 and digits.replace(".", "", 1).isdecimal():
+        return float(raw)
+    return raw
 
 
-def parse_yaml(text: str) -> Dict[str, Any]:
-    # Minimal YAML parser: supports nested mappings/lists with 2-space indents only.
-    # Limitations: no multiline strings, no anchors/aliases, no inline lists/maps.
-    root: Dict[str, Any] = {}
-    stack: List[Dict[str, Any]] = []
+_MAP = "map"
+_LIST_ITEM = "list_item"
+_LIST_KV = "list_kv"
 
-    class Frame:
-        def __init__(self, indent: int, container: Any, last_key: Optional[str]) -> None:
-            self.indent = indent
-            self.container = container
-            self.last_key = last_key
 
-    frames: List[Frame] = [Frame(0, root, None)]
-
-    lines = text.splitlines()
-    for raw_line in lines:
-        line = raw_line.split("#", 1)[0].rstrip("\n")
-        if not line.strip():
+def _tokenize(text: str) -> Iterator[Tuple[int, str, Optional[str], str, str]]:
+    # Token events for parse_yaml. splitlines() and partition() cut lines,
+    # comments and key/value pairs in C, so no per-character work runs in Python.
+    # Yields (indent, kind, key, value, raw_line); value is "" when it is pending.
+    for raw_line in text.splitlines():
+        body = raw_line.partition("#")[0]
+        content = body.strip()
+        if not content:
             continue
-        indent = len(line) - len(line.lstrip(" "))
+        indent = len(body) - len(body.lstrip(" "))
         if indent % 2 != 0:
             raise ValueError(f"Invalid indentation: '{raw_line}'")
-        stripped = line.strip()
 
+        if content.startswith("- "):
+            item_text = content[2:].strip()
+            key, sep, rest = item_text.partition(":")
+            if sep:
+                yield indent, _LIST_KV, key.strip(), rest.strip(), raw_line
+            else:
+                yield indent, _LIST_ITEM, None, item_text, raw_line
+            continue
+
+        key, sep, rest = content.partition(":")
+        if not sep:
+            raise ValueError(f"Invalid line (missing ':'): '{raw_line}'")
+        yield indent, _MAP, key.strip(), rest.strip(), raw_line
+
+
+class _Frame:
+    __slots__ = ("indent", "container", "last_key")
+
+    def __init__(self, indent: int, container: Any, last_key: Optional[str]) -> None:
+        self.indent = indent
+        self.container = container
+        self.last_key = last_key
+
+
+def parse_yaml(text: str) -> Dict[str, Any]:
+    # Minimal YAML parser: supports nested mappings/lists with 2-space indents only.
+    # Limitations: no multiline strings, no anchors/aliases, no inline lists/maps.
+    root: Dict[str, Any] = {}
+    frames: List[_Frame] = [_Frame(0, root, None)]
+
+    for indent, kind, key, value, raw_line in _tokenize(text):
         while frames and indent < frames[-1].indent:
             frames.pop()
         if not frames:
@@ -127,10 +144,10 @@ def parse_yaml(text: str) -> Dict[str, Any]:
                 if frame.last_key is None:
                     raise ValueError(f"Missing key for nested mapping: '{raw_line}'")
                 if frame.container.get(frame.last_key, None) is PENDING:
-                    if stripped.startswith("- "):
-                        frame.container[frame.last_key] = []
-                    else:
+                    if kind == _MAP:
                         frame.container[frame.last_key] = {}
+                    else:
+                        frame.container[frame.last_key] = []
                 new_container = frame.container[frame.last_key]
             elif isinstance(frame.container, list):
                 if not frame.container:
@@ -142,48 +159,30 @@ def parse_yaml(text: str) -> Dict[str, Any]:
                 new_container = last
             else:
                 raise ValueError(f"Unsupported container at indent: '{raw_line}'")
-            frame = Frame(indent, new_container, None)
+            frame = _Frame(indent, new_container, None)
             frames.append(frame)
 
-        if stripped.startswith("- "):
-            item_text = stripped[2:].strip()
-            container = frame.container
-            if isinstance(container, dict):
-                if frame.last_key is None:
-                    raise ValueError(f"List item without key: '{raw_line}'")
-                if container.get(frame.last_key, None) is PENDING:
-                    container[frame.last_key] = []
-                container = container[frame.last_key]
-            if not isinstance(container, list):
-                raise ValueError(f"Expected list for item: '{raw_line}'")
-            if not item_text:
-                container.append(PENDING)
-                continue
-            if ":" in item_text:
-                key, rest = item_text.split(":", 1)
-                key = key.strip()
-                value = rest.strip()
-                if value == "":
-                    item = {key: PENDING}
-                else:
-                    item = {key: parse_value(value)}
-                container.append(item)
-                frame.last_key = key
-            else:
-                container.append(parse_value(item_text))
+        if kind == _MAP:
+            frame.container[key] = PENDING if value == "" else parse_value(value)
+            frame.last_key = key
             continue
 
-        if ":" not in stripped:
-            raise ValueError(f"Invalid line (missing ':'): '{raw_line}'")
-        key, rest = stripped.split(":", 1)
-        key = key.strip()
-        value = rest.strip()
-        if value == "":
-            frame.container[key] = PENDING
+        container = frame.container
+        if isinstance(container, dict):
+            if frame.last_key is None:
+                raise ValueError(f"List item without key: '{raw_line}'")
+            if container.get(frame.last_key, None) is PENDING:
+                container[frame.last_key] = []
+            container = container[frame.last_key]
+        if not isinstance(container, list):
+            raise ValueError(f"Expected list for item: '{raw_line}'")
+        if kind == _LIST_KV:
+            container.append({key: PENDING if value == "" else parse_value(value)})
             frame.last_key = key
+        elif value == "":
+            container.append(PENDING)
         else:
-            frame.container[key] = parse_value(value)
-            frame.last_key = key
+            container.append(parse_value(value))
 
     def finalize(obj: Any) -> Any:
         if obj is PENDING:
@@ -197,11 +196,75 @@ def parse_yaml(text: str) -> Dict[str, Any]:
     return finalize(root)
 
 
+def _dump_scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value)
+    if "#" in text:
+        # parse_yaml treats '#' as a comment even inside quotes, so no quoting helps.
+        raise ValueError(f"Values containing '#' are not supported: {text!r}")
+    # Quote strings that would not read back as the same string.
+    if text and text == text.strip() and parse_value(text) == text and not text.startswith("- ") and ": " not in text:
+        return text
+    return f"'{text}'" if '"' in text else f'"{text}"'
+
+
+def dump_yaml(obj: Dict[str, Any], indent: int = 0) -> str:
+    # Emits the 2-space subset that parse_yaml reads. Comments are not preserved.
+    pad = " " * indent
+    lines: List[str] = []
+    for key, value in obj.items():
+        if "#" in str(key):
+            raise ValueError(f"Keys containing '#' are not supported: {key!r}")
+        if isinstance(value, dict):
+            lines.append(f"{pad}{key}:")
+            if value:
+                lines.append(dump_yaml(value, indent + 2))
+        elif isinstance(value, list):
+            lines.append(f"{pad}{key}:")
+            for item in value:
+                if isinstance(item, dict) and item:
+                    nested = dump_yaml(item, indent + 4)
+                    lines.append(f"{pad}  - {nested[indent + 4:]}")
+                elif isinstance(item, (dict, list)):
+                    raise ValueError(f"Unsupported list item under '{key}'")
+                else:
+                    lines.append(f"{pad}  - {_dump_scalar(item)}")
+        else:
+            lines.append(f"{pad}{key}: {_dump_scalar(value)}")
+    return "\n".join(lines)
+
+
+_CONFIG_CACHE: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+_CONFIG_CACHE_STATS = {"hits": 0, "misses": 0}
+
+
 def load_config(path: str) -> Dict[str, Any]:
-    if not os.path.exists(path):
-        raise FileNotFoundError(path)
-    with open(path, "r", encoding="utf-8") as handle:
-        return parse_yaml(handle.read())
+    # Parsed configs are reused until the file's mtime or size changes.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(path) from None
+    cached = _CONFIG_CACHE.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        _CONFIG_CACHE_STATS["hits"] += 1
+        config = cached[2]
+    else:
+        _CONFIG_CACHE_STATS["misses"] += 1
+        with open(path, "r", encoding="utf-8") as handle:
+            config = parse_yaml(handle.read())
+        _CONFIG_CACHE[path] = (st.st_mtime_ns, st.st_size, config)
+    if os.environ.get("AG_CACHE_STATS") == "1":
+        print(
+            f"config cache: hits={_CONFIG_CACHE_STATS['hits']} misses={_CONFIG_CACHE_STATS['misses']}",
+            file=sys.stderr,
+        )
+    # Callers add top-level keys such as "_path"; keep the cached copy clean.
+    return dict(config)
 
 
 def config_path_from_env() -> str:
@@ -240,9 +303,98 @@ def device_endpoint(device: Dict[str, Any]) -> str:
     return f"http://{hostname}/measures/current"
 
 
+_requests: Any = None
+_SESSION: Any = None
+
+
+def _load_requests() -> Any:
+    # Deferred until the first network call so config/history commands skip the
+    # import cost of requests (or http.client for the fallback).
+    global _requests, _SESSION
+    if _requests is not None:
+        return _requests
+    try:
+        import requests  # type: ignore
+    except ModuleNotFoundError:  # fallback for environments without requests
+        import http.client
+        import threading
+        import urllib.parse
+
+        class _RequestError(RuntimeError):
+            pass
+
+        class _Response:
+            def __init__(self, status: int, body: bytes) -> None:
+                self.status_code = status
+                self._body = body
+
+            def raise_for_status(self) -> None:
+                if self.status_code >= 400:
+                    raise _RequestError(f"HTTP {self.status_code}")
+
+            def json(self) -> Any:
+                return json.loads(self._body.decode("utf-8"))
+
+        class _Session:
+            # Keeps one http.client connection per host (and per thread, since
+            # connections are not thread-safe) so keep-alive is reused.
+            def __init__(self) -> None:
+                self._local = threading.local()
+
+            @property
+            def _conns(self) -> Dict[Tuple[str, str], http.client.HTTPConnection]:
+                conns = getattr(self._local, "conns", None)
+                if conns is None:
+                    conns = self._local.conns = {}
+                return conns
+
+            def _connection(self, scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+                conn = self._conns.get((scheme, netloc))
+                if conn is None:
+                    conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+                    conn = conn_cls(netloc, timeout=timeout)
+                    self._conns[(scheme, netloc)] = conn
+                conn.timeout = timeout
+                return conn
+
+            def get(self, url: str, timeout: float = 5) -> _Response:
+                parts = urllib.parse.urlsplit(url)
+                path = parts.path or "/"
+                if parts.query:
+                    path = f"{path}?{parts.query}"
+                for attempt in range(2):
+                    conn = self._connection(parts.scheme, parts.netloc, timeout)
+                    try:
+                        conn.request("GET", path)
+                        response = conn.getresponse()
+                        return _Response(response.status, response.read())
+                    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                        # The server dropped an idle keep-alive connection; reconnect once.
+                        conn.close()
+                        self._conns.pop((parts.scheme, parts.netloc), None)
+                        if attempt:
+                            raise _RequestError(str(exc)) from exc
+                    except (OSError, http.client.HTTPException) as exc:
+                        conn.close()
+                        self._conns.pop((parts.scheme, parts.netloc), None)
+                        raise _RequestError(str(exc)) from exc
+                raise _RequestError(f"Unable to fetch {url}")
+
+        # Only the parts of the requests API that fetch_reading() uses.
+        class _RequestsShim:
+            RequestException = _RequestError
+            Session = _Session
+
+        requests = _RequestsShim()
+    _SESSION = requests.Session()
+    _requests = requests
+    return requests
+
+
 def fetch_reading(endpoint: str, timeout: float) -> Dict[str, Any]:
+    requests = _load_requests()
     try:
-        response = requests.get(endpoint, timeout=timeout)
+        response = _SESSION.get(endpoint, timeout=timeout)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as exc:
@@ -251,9 +403,48 @@ def fetch_reading(endpoint: str, timeout: float) -> Dict[str, Any]:
         raise RuntimeError("Invalid JSON response from device") from exc
 
 
+_READING_FIELDS = (
+    "pm01",
+    "pm02",
+    "pm10",
+    "pm02Compensated",
+    "atmp",
+    "atmpCompensated",
+    "rhum",
+    "rhumCompensated",
+    "rco2",
+    "tvocIndex",
+    "tvocRaw",
+    "noxIndex",
+    "noxRaw",
+    "wifi",
+    "ledMode",
+    "serialno",
+    "firmware",
+    "model",
+)
+_COLUMNS = ("device", "ts") + _READING_FIELDS + ("raw_json",)
+_INSERT_SQL = f"INSERT INTO readings ({','.join(_COLUMNS)}) VALUES ({','.join('?' * len(_COLUMNS))})"
+
+
+ANALYZE_MIN_ROWS = 1000
+
+
 def open_db(path: str) -> sqlite3.Connection:
+    import sqlite3
+
     os.makedirs(os.path.dirname(path), exist_ok=True)
     conn = sqlite3.connect(path)
+    # WAL with synchronous=NORMAL only fsyncs at checkpoint; SQLite reports the
+    # mode it actually applied, so filesystems without WAL support keep the
+    # rollback journal (and its default synchronous=FULL).
+    mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()
+    if mode and str(mode[0]).lower() == "wal":
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA busy_timeout=3000")
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS readings (
@@ -278,45 +469,71 @@ def open_db(path: str) -> sqlite3.Connection:
             serialno TEXT,
             firmware TEXT,
             model TEXT,
-            raw_json TEXT
+            raw_json BLOB
         )
         """
     )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_device_ts ON readings(device, ts DESC)")
+    # user_version holds the row count at the last ANALYZE; refresh planner
+    # statistics once the table has grown to twice that size.
+    analyzed_rows = conn.execute("PRAGMA user_version").fetchone()[0]
+    rows = conn.execute("SELECT MAX(id) FROM readings").fetchone()[0] or 0
+    if rows >= max(ANALYZE_MIN_ROWS, 2 * analyzed_rows):
+        conn.execute("ANALYZE")
+        conn.execute(f"PRAGMA user_version = {int(rows)}")
+        conn.commit()
     return conn
 
 
-def store_reading(conn: sqlite3.Connection, device_name: str, data: Dict[str, Any]) -> None:
-    now = int(time.time())
-    payload = {
-        "device": device_name,
-        "ts": now,
-        "pm01": data.get("pm01"),
-        "pm02": data.get("pm02"),
-        "pm10": data.get("pm10"),
-        "pm02Compensated": data.get("pm02Compensated"),
-        "atmp": data.get("atmp"),
-        "atmpCompensated": data.get("atmpCompensated"),
-        "rhum": data.get("rhum"),
-        "rhumCompensated": data.get("rhumCompensated"),
-        "rco2": data.get("rco2"),
-        "tvocIndex": data.get("tvocIndex"),
-        "tvocRaw": data.get("tvocRaw"),
-        "noxIndex": data.get("noxIndex"),
-        "noxRaw": data.get("noxRaw"),
-        "wifi": data.get("wifi"),
-        "ledMode": data.get("ledMode"),
-        "serialno": data.get("serialno"),
-        "firmware": data.get("firmware"),
-        "model": data.get("model"),
-        "raw_json": json.dumps(data, ensure_ascii=False),
-    }
-    columns = ",".join(payload.keys())
-    placeholders = ",".join(["?"] * len(payload))
-    conn.execute(
-        f"INSERT INTO readings ({columns}) VALUES ({placeholders})",
-        list(payload.values()),
+def encode_raw_json(data: Dict[str, Any]) -> bytes:
+    import zlib
+
+    # zlib level 1 is cheap; a full device payload shrinks about 1.5x (294 -> 194 bytes).
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(payload.encode("utf-8"), 1)
+
+
+_DB_CONNS: Dict[str, sqlite3.Connection] = {}
+
+
+def get_db(path: str) -> sqlite3.Connection:
+    # One connection per database for the whole process, so schema checks and
+    # PRAGMAs run once even when a command both stores and reads.
+    conn = _DB_CONNS.get(path)
+    if conn is None:
+        conn = open_db(path)
+        _DB_CONNS[path] = conn
+        atexit.register(conn.close)
+    return conn
+
+
+def reading_row(device_name: str, ts: int, data: Dict[str, Any], keep_raw: bool = True) -> Tuple[Any, ...]:
+    return (
+        device_name,
+        ts,
+        *map(data.get, _READING_FIELDS),
+        encode_raw_json(data) if keep_raw else None,
     )
-    conn.commit()
+
+
+def store_readings(
+    conn: sqlite3.Connection,
+    device_name: str,
+    readings: Iterable[Dict[str, Any]],
+    keep_raw: bool = True,
+) -> int:
+    # All rows share one transaction, so a batch costs a single commit (and fsync).
+    now = int(time.time())
+    rows = [reading_row(device_name, now, data, keep_raw) for data in readings]
+    if not rows:
+        return 0
+    with conn:
+        conn.executemany(_INSERT_SQL, rows)
+    return len(rows)
+
+
+def store_reading(conn: sqlite3.Connection, device_name: str, data: Dict[str, Any], keep_raw: bool = True) -> None:
+    store_readings(conn, device_name, [data], keep_raw)
 
 
 def format_number(value: Any, unit: str = "", decimals: int = 1) -> str:
@@ -330,55 +547,55 @@ def format_number(value: Any, unit: str = "", decimals: int = 1) -> str:
     return f"{fmt} {unit}".strip()
 
 
+# Upper bounds are inclusive for PM2.5 (<=) and exclusive for CO2 (<), hence
+# bisect_left for one and bisect_right for the other.
+_PM25_EDGES = (12, 35.4, 55.4, 150.4)
+_PM25_LABELS = ("Excellent", "Moderate", "Unhealthy (Sensitive)", "Unhealthy", "Hazardous")
+_CO2_EDGES = (600, 1000, 2000)
+_CO2_LABELS = ("Fresh", "Good", "Moderate", "Poor")
+
+
 def classify_pm25(value: Optional[float]) -> str:
     if value is None:
         return "Unknown"
-    if value <= 12:
-        return "Excellent"
-    if value <= 35.4:
-        return "Moderate"
-    if value <= 55.4:
-        return "Unhealthy (Sensitive)"
-    if value <= 150.4:
-        return "Unhealthy"
-    return "Hazardous"
+    return _PM25_LABELS[bisect_left(_PM25_EDGES, value)]
 
 
 def classify_co2(value: Optional[float]) -> str:
     if value is None:
         return "Unknown"
-    if value < 600:
-        return "Fresh"
-    if value < 1000:
-        return "Good"
-    if value < 2000:
-        return "Moderate"
-    return "Poor"
+    return _CO2_LABELS[bisect_right(_CO2_EDGES, value)]
+
+
+def _prefer(data: Dict[str, Any], key: str, fallback: str) -> Any:
+    # Compensated readings win unless missing; a reading of 0 is still a reading.
+    value = data.get(key)
+    return data.get(fallback) if value is None else value
 
 
-def status_output(device: Dict[str, Any], data: Dict[str, Any], thresholds: Dict[str, Any]) -> str:
+def status_output(device: Dict[str, Any], data: Dict[str, Any], thresholds: Dict[str, Bounds]) -> str:
     name = device.get("name") or device.get("hostname")
     header = color(f"🌡️ AirGradient Status — {name}", Style.BOLD)
 
-    pm25 = data.get("pm02Compensated") or data.get("pm02")
+    pm25 = _prefer(data, "pm02Compensated", "pm02")
     co2 = data.get("rco2")
     tvoc = data.get("tvocIndex")
     nox = data.get("noxIndex")
-    temp = data.get("atmpCompensated") or data.get("atmp")
-    humid = data.get("rhumCompensated") or data.get("rhum")
+    temp = _prefer(data, "atmpCompensated", "atmp")
+    humid = _prefer(data, "rhumCompensated", "rhum")
 
     pm25_status = classify_pm25(pm25)
     co2_status = classify_co2(co2)
 
     quality_lines = [
-        f"  PM2.5:  {format_number(pm25, 'µg/m³')}  {status_icon(pm25, thresholds.get('pm25', {}))} {pm25_status}",
-        f"  CO2:    {format_number(co2, 'ppm', 0)}  {status_icon(co2, thresholds.get('co2', {}))} {co2_status}",
-        f"  TVOC:   {format_number(tvoc, 'index', 0)}  {status_icon(tvoc, thresholds.get('tvoc', {}))}",
-        f"  NOx:    {format_number(nox, 'index', 0)}  {status_icon(nox, thresholds.get('nox', {}))}",
+        f"  PM2.5:  {format_number(pm25, 'µg/m³')}  {status_icon(pm25, thresholds['pm25'])} {pm25_status}",
+        f"  CO2:    {format_number(co2, 'ppm', 0)}  {status_icon(co2, thresholds['co2'])} {co2_status}",
+        f"  TVOC:   {format_number(tvoc, 'index', 0)}  {status_icon(tvoc, thresholds['tvoc'])}",
+        f"  NOx:    {format_number(nox, 'index', 0)}  {status_icon(nox, thresholds['nox'])}",
     ]
 
-    temp_range = thresholds.get("temp_c", {})
-    humid_range = thresholds.get("humidity", {})
+    temp_range = thresholds["temp_c"]
+    humid_range = thresholds["humidity"]
 
     climate_lines = [
         f"  Temp:   {format_number(temp, '°C')}  {status_icon_range(temp, temp_range)}",
@@ -406,34 +623,32 @@ def status_output(device: Dict[str, Any], data: Dict[str, Any], thresholds: Dict
     return "\n".join(sections)
 
 
-def status_icon(value: Optional[float], threshold: Dict[str, Any]) -> str:
+def status_icon(value: Optional[float], threshold: Bounds) -> str:
     if value is None:
-        return color("⚪", Style.GRAY)
-    warn = threshold.get("warn")
-    critical = threshold.get("critical")
+        return icon(_ICON_UNKNOWN)
+    warn, critical = threshold
     if critical is not None and value >= critical:
-        return color("🟥", Style.RED)
+        return icon(_ICON_CRITICAL)
     if warn is not None and value >= warn:
-        return color("🟨", Style.YELLOW)
-    return color("✅", Style.GREEN)
+        return icon(_ICON_WARN)
+    return icon(_ICON_OK)
 
 
-def status_icon_range(value: Optional[float], threshold: Dict[str, Any]) -> str:
+def status_icon_range(value: Optional[float], threshold: Bounds) -> str:
     if value is None:
-        return color("⚪", Style.GRAY)
-    min_v = threshold.get("min")
-    max_v = threshold.get("max")
+        return icon(_ICON_UNKNOWN)
+    min_v, max_v = threshold
     if min_v is not None and value < min_v:
-        return color("⚠️ Low", Style.YELLOW)
+        return icon(_ICON_LOW)
     if max_v is not None and value > max_v:
-        return color("⚠️ High", Style.YELLOW)
-    return color("✅ OK", Style.GREEN)
+        return icon(_ICON_HIGH)
+    return icon(_ICON_RANGE_OK)
 
 
 def print_readings(data: Dict[str, Any]) -> None:
-    print(color("📋 Raw Readings", Style.BOLD))
-    for key in sorted(data.keys()):
-        print(f"  {key}: {data[key]}")
+    lines = [color("📋 Raw Readings", Style.BOLD)]
+    lines.extend(f"  {key}: {data[key]}" for key in sorted(data.keys()))
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def ensure_config(args: argparse.Namespace) -> Dict[str, Any]:
@@ -448,8 +663,28 @@ def ensure_config(args: argparse.Namespace) -> Dict[str, Any]:
     return config
 
 
-def thresholds_from_config(config: Dict[str, Any]) -> Dict[str, Any]:
-    return config.get("thresholds", {})
+def resolve_thresholds(thresholds: Dict[str, Any]) -> Dict[str, Bounds]:
+    # Level rules become (warn, critical) and range rules (min, max), so the
+    # per-reading checks unpack tuples instead of repeating dict lookups.
+    resolved: Dict[str, Bounds] = {}
+    for key in LEVEL_THRESHOLDS:
+        rules = thresholds.get(key) or {}
+        resolved[key] = (rules.get("warn"), rules.get("critical"))
+    for key in RANGE_THRESHOLDS:
+        rules = thresholds.get(key) or {}
+        resolved[key] = (rules.get("min"), rules.get("max"))
+    return resolved
+
+
+def thresholds_from_config(config: Dict[str, Any]) -> Dict[str, Bounds]:
+    return resolve_thresholds(config.get("thresholds", {}))
+
+
+def store_device_reading(config: Dict[str, Any], device: Dict[str, Any], data: Dict[str, Any]) -> None:
+    storage = config.get("storage", {})
+    db_path = storage.get("db_path", os.path.join("data", "airgradient.db"))
+    keep_raw = bool(storage.get("raw_json", True))
+    store_reading(get_db(db_path), device.get("name") or device.get("hostname"), data, keep_raw)
 
 
 def fetch_and_maybe_store(config: Dict[str, Any], device: Dict[str, Any], store: bool) -> Dict[str, Any]:
@@ -457,46 +692,77 @@ def fetch_and_maybe_store(config: Dict[str, Any], device: Dict[str, Any], store:
     timeout = float(config.get("network", {}).get("timeout_sec", 5))
     data = fetch_reading(endpoint, timeout)
     if store:
-        db_path = config.get("storage", {}).get("db_path", os.path.join("data", "airgradient.db"))
-        conn = open_db(db_path)
-        try:
-            store_reading(conn, device.get("name") or device.get("hostname"), data)
-        finally:
-            conn.close()
+        store_device_reading(config, device, data)
     return data
 
 
-def alerts_for_reading(data: Dict[str, Any], thresholds: Dict[str, Any]) -> List[str]:
+def fetch_all(config: Dict[str, Any], devices: List[Dict[str, Any]]) -> List[Any]:
+    # Devices are fetched in parallel, so wall time tracks the slowest device.
+    # Each result is either the reading dict or the exception raised for it.
+    from concurrent.futures import ThreadPoolExecutor
+
+    _load_requests()  # create the shared session before the worker threads start
+    network = config.get("network", {})
+    timeout = float(network.get("timeout_sec", 5))
+    max_workers = max(1, min(int(network.get("max_concurrent", 8)), len(devices)))
+
+    def fetch(device: Dict[str, Any]) -> Any:
+        try:
+            return fetch_reading(device_endpoint(device), timeout)
+        except (RuntimeError, ValueError) as exc:
+            return exc
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch, devices))
+
+
+def status_all(config: Dict[str, Any], thresholds: Dict[str, Bounds], store: bool) -> Tuple[str, int]:
+    devices = config.get("devices") or []
+    if not devices:
+        raise ValueError("No devices configured. Add devices to config.yaml.")
+    blocks: List[str] = []
+    failures = 0
+    for device, result in zip(devices, fetch_all(config, devices)):
+        name = device.get("name") or device.get("hostname")
+        if isinstance(result, Exception):
+            failures += 1
+            blocks.append(color(f"❌ {name}: {result}", Style.RED))
+            continue
+        if store:
+            store_device_reading(config, device, result)
+        blocks.append(status_output(device, result, thresholds))
+    return "\n\n".join(blocks), failures
+
+
+def alerts_for_reading(data: Dict[str, Any], thresholds: Dict[str, Bounds]) -> List[str]:
     alerts: List[str] = []
-    pm25 = data.get("pm02Compensated") or data.get("pm02")
+    pm25 = _prefer(data, "pm02Compensated", "pm02")
     co2 = data.get("rco2")
-    temp = data.get("atmpCompensated") or data.get("atmp")
-    humid = data.get("rhumCompensated") or data.get("rhum")
+    temp = _prefer(data, "atmpCompensated", "atmp")
+    humid = _prefer(data, "rhumCompensated", "rhum")
 
-    def check_level(label: str, value: Optional[float], rules: Dict[str, Any]) -> None:
+    def check_level(label: str, value: Optional[float], rules: Bounds) -> None:
         if value is None:
             return
-        warn = rules.get("warn")
-        critical = rules.get("critical")
+        warn, critical = rules
         if critical is not None and value >= critical:
             alerts.append(f"CRITICAL {label}: {value}")
         elif warn is not None and value >= warn:
             alerts.append(f"WARN {label}: {value}")
 
-    def check_range(label: str, value: Optional[float], rules: Dict[str, Any]) -> None:
+    def check_range(label: str, value: Optional[float], rules: Bounds) -> None:
         if value is None:
             return
-        min_v = rules.get("min")
-        max_v = rules.get("max")
+        min_v, max_v = rules
         if min_v is not None and value < min_v:
             alerts.append(f"WARN {label} low: {value}")
         if max_v is not None and value > max_v:
             alerts.append(f"WARN {label} high: {value}")
 
-    check_level("PM2.5", pm25, thresholds.get("pm25", {}))
-    check_level("CO2", co2, thresholds.get("co2", {}))
-    check_range("Temperature", temp, thresholds.get("temp_c", {}))
-    check_range("Humidity", humid, thresholds.get("humidity", {}))
+    check_level("PM2.5", pm25, thresholds["pm25"])
+    check_level("CO2", co2, thresholds["co2"])
+    check_range("Temperature", temp, thresholds["temp_c"])
+    check_range("Humidity", humid, thresholds["humidity"])
 
     return alerts
 
@@ -510,9 +776,9 @@ def print_alerts(alerts: List[str]) -> int:
         if alert.startswith("CRITICAL"):
             severity = 2
     color_code = Style.RED if severity == 2 else Style.YELLOW
-    print(color("🚨 Alerts", Style.BOLD))
-    for alert in alerts:
-        print(color(f"  {alert}", color_code))
+    lines = [color("🚨 Alerts", Style.BOLD)]
+    lines.extend(color(f"  {alert}", color_code) for alert in alerts)
+    sys.stdout.write("\n".join(lines) + "\n")
     return severity
 
 
@@ -527,7 +793,8 @@ def parse_args() -> argparse.Namespace:
 
     sub = parser.add_subparsers(dest="command", required=True)
 
-    sub.add_parser("status", help="Show formatted status output")
+    status_parser = sub.add_parser("status", help="Show formatted status output")
+    status_parser.add_argument("--all", action="store_true", help="Show every configured device")
 
     readings_parser = sub.add_parser("readings", help="Show raw readings")
     readings_parser.add_argument("--json", action="store_true", help="Print JSON")
@@ -535,6 +802,9 @@ def parse_args() -> argparse.Namespace:
     history_parser = sub.add_parser("history", help="Show historical readings")
     history_parser.add_argument("--days", type=int, default=7, help="Days of history")
     history_parser.add_argument("--json", action="store_true", help="Print JSON")
+    history_parser.add_argument(
+        "--limit", type=int, help=f"Maximum rows (default {HISTORY_TEXT_LIMIT} for text, all for JSON)"
+    )
 
     sub.add_parser("alerts", help="Check alerts and return status code")
 
@@ -559,93 +829,122 @@ def show_config(config: Dict[str, Any]) -> None:
 
 
 def set_config_value(config_path: str, key_path: str, value: str) -> None:
-    # Simple line-based update for key paths like thresholds.pm25.warn.
-    # Limitations: only updates existing mappings, no list support, no auto-creation.
-    with open(config_path, "r", encoding="utf-8") as handle:
-        lines = handle.readlines()
+    # Updates key paths like thresholds.pm25.warn or devices.0.hostname by editing
+    # the parsed config and writing it back in canonical form.
+    # Limitations: intermediate keys must exist, and comments are not preserved.
+    import copy
+    import stat
+
+    if "#" in key_path or "#" in value:
+        raise ValueError("'#' starts a comment in config.yaml and cannot be set. Edit config manually.")
+    config = copy.deepcopy(load_config(config_path))
 
     keys = key_path.split(".")
-    indent = 0
-    idx = 0
-    found = False
-
-    while idx < len(lines):
-        line = lines[idx]
-        stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
-            idx += 1
-            continue
-        current_indent = len(line) - len(line.lstrip(" "))
-        key = stripped.split(":", 1)[0]
-        if current_indent == indent and key == keys[0]:
-            if len(keys) == 1:
-                lines[idx] = f"{key}: {value}\n"
-                found = True
-                break
-            indent += 2
-            keys = keys[1:]
-        idx += 1
-
-    if not found:
+    node: Any = config
+    for key in keys[:-1]:
+        if isinstance(node, dict) and key in node:
+            node = node[key]
+        elif isinstance(node, list) and key.isdigit() and int(key) < len(node):
+            node = node[int(key)]
+        else:
+            raise ValueError("Key path not found or unsupported. Edit config manually.")
+        if not isinstance(node, (dict, list)):
+            raise ValueError("Key path not found or unsupported. Edit config manually.")
+
+    leaf: Any = keys[-1]
+    if isinstance(node, list):
+        if not (leaf.isdigit() and int(leaf) < len(node)):
+            raise ValueError("Key path not found or unsupported. Edit config manually.")
+        leaf = int(leaf)
+        current = node[leaf]
+    else:
+        current = node.get(leaf)
+    # Only scalars can be set; replacing a whole mapping or list would break the config.
+    if isinstance(current, (dict, list)):
         raise ValueError("Key path not found or unsupported. Edit config manually.")
+    node[leaf] = parse_value(value)
 
-    with open(config_path, "w", encoding="utf-8") as handle:
-        handle.writelines(lines)
-
-
-def history_output(config: Dict[str, Any], device: Dict[str, Any], days: int, json_out: bool) -> None:
+    # Render first so an unsupported shape fails before anything touches disk.
+    text = dump_yaml(config) + "\n"
+    tmp_path = f"{config_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(config_path).st_mode))
+        os.replace(tmp_path, config_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+HISTORY_TEXT_LIMIT = 200
+
+
+def history_output(
+    config: Dict[str, Any],
+    device: Dict[str, Any],
+    days: int,
+    json_out: bool,
+    limit: Optional[int] = None,
+) -> None:
     db_path = config.get("storage", {}).get("db_path", os.path.join("data", "airgradient.db"))
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"No database found at {db_path}. Run 'ag store' to collect data.")
 
+    if limit is None:
+        # Text output is for terminals, so cap it; JSON returns everything by default.
+        limit = -1 if json_out else HISTORY_TEXT_LIMIT
     cutoff = int(time.time() - days * 86400)
-    conn = open_db(db_path)
-    try:
-        cursor = conn.execute(
-            """
-            SELECT ts, pm02Compensated, pm02, rco2, atmpCompensated, atmp, rhumCompensated, rhum
-            FROM readings
-            WHERE device = ? AND ts >= ?
-            ORDER BY ts DESC
-            """,
-            (device.get("name") or device.get("hostname"), cutoff),
-        )
-        rows = cursor.fetchall()
-    finally:
-        conn.close()
+    conn = get_db(db_path)
+    # Filtering, fallbacks, ordering and the row limit all happen in SQLite, and
+    # rows are streamed straight from the cursor instead of fetchall().
+    cursor = conn.execute(
+        """
+        SELECT ts,
+               COALESCE(pm02Compensated, pm02) AS pm25,
+               rco2 AS co2,
+               COALESCE(atmpCompensated, atmp) AS temp,
+               COALESCE(rhumCompensated, rhum) AS humidity
+        FROM readings
+        WHERE device = ? AND ts >= ?
+        ORDER BY ts DESC
+        LIMIT ?
+        """,
+        (device.get("name") or device.get("hostname"), cutoff, limit),
+    )
 
     if json_out:
-        data = []
-        for row in rows:
-            data.append(
-                {
-                    "ts": row[0],
-                    "pm25": row[1] if row[1] is not None else row[2],
-                    "co2": row[3],
-                    "temp": row[4] if row[4] is not None else row[5],
-                    "humidity": row[6] if row[6] is not None else row[7],
-                }
-            )
-        print(json.dumps(data, indent=2))
+        # Same layout as json.dumps(list, indent=2), written one record at a time.
+        # Record keys come from the column aliases in the query.
+        names = [column[0] for column in cursor.description]
+        first = True
+        for row in cursor:
+            record = dict(zip(names, row))
+            sys.stdout.write("[\n  " if first else ",\n  ")
+            sys.stdout.write(json.dumps(record, indent=2).replace("\n", "\n  "))
+            first = False
+        sys.stdout.write("[]\n" if first else "\n]\n")
         return
 
-    print(color(f"🕒 History ({days} days)", Style.BOLD))
-    for row in rows[:200]:
-        ts = datetime.fromtimestamp(row[0], tz=timezone.utc).astimezone()
-        pm25 = row[1] if row[1] is not None else row[2]
-        co2 = row[3]
-        temp = row[4] if row[4] is not None else row[5]
-        humid = row[6] if row[6] is not None else row[7]
-        print(
-            f"{ts.strftime('%Y-%m-%d %H:%M')}  PM2.5 {format_number(pm25, 'µg/m³')}  CO2 {format_number(co2, 'ppm', 0)}  Temp {format_number(temp, '°C')}  Hum {format_number(humid, '%')}"
+    lines = [color(f"🕒 History ({days} days)", Style.BOLD)]
+    # time.localtime() converts in C without building datetime objects and,
+    # unlike a cached offset, stays correct across DST changes in the window.
+    strftime = time.strftime
+    localtime = time.localtime
+    for ts, pm25, co2, temp, humid in cursor:
+        ts = strftime("%Y-%m-%d %H:%M", localtime(ts))
+        lines.append(
+            f"{ts}  PM2.5 {format_number(pm25, 'µg/m³')}  CO2 {format_number(co2, 'ppm', 0)}  Temp {format_number(temp, '°C')}  Hum {format_number(humid, '%')}"
         )
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def main() -> None:
     args = parse_args()
     try:
         global COLOR_ENABLED
-        if args.no_color or os.environ.get("NO_COLOR") is not None or not sys.stdout.isatty():
+        if args.no_color:
             COLOR_ENABLED = False
         config = ensure_config(args)
         device = resolve_device_config(config, args.device)
@@ -665,6 +964,12 @@ def main() -> None:
         store_on_read = bool(config.get("storage", {}).get("store_on_read", False))
 
         if args.command == "status":
+            if args.all:
+                output, failures = status_all(config, thresholds, store_on_read)
+                print(output)
+                if failures:
+                    sys.exit(3)
+                return
             data = fetch_and_maybe_store(config, device, store_on_read)
             print(status_output(device, data, thresholds))
             return
@@ -684,10 +989,12 @@ def main() -> None:
             sys.exit(code)
 
         if args.command == "history":
-            history_output(config, device, args.days, args.json)
+            history_output(config, device, args.days, args.json, args.limit)
             return
 
         if args.command == "store":
+            from datetime import datetime
+
             data = fetch_and_maybe_store(config, device, True)
             ts = datetime.now().strftime("%Y-%m-%d %H:%M")
             print(color(f"✅ Stored reading at {ts}", Style.GREEN))